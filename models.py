@@ -1,6 +1,7 @@
 """Datastore model classes.
 """
 from datetime import datetime, timedelta, timezone
+import itertools
 import logging
 import os
 import re
@@ -27,6 +28,11 @@ PUBLISH_TYPES = VERB_TYPES + ('preview', 'delete')
 
 MAX_AUTHOR_URLS = 5
 
+# this was 30 in google.appengine.ext.ndb. haven't found it in google.cloud.ndb
+# yet, or whether it's even there at all, but we only rarely hit it anyway, so
+# let's just keep it as is for now.
+MAX_ALLOWABLE_QUERIES = 30
+
 REFETCH_HFEED_TRIGGER = datetime.fromtimestamp(-1, tz=timezone.utc)
 
 # limit size of block lists stored in source entities to try to keep whole
@@ -1170,6 +1176,82 @@ class SyndicatedPost(ndb.Model):
     r.put()
     return r
 
+  @classmethod
+  @ndb.transactional()
+  def insert_multi(cls, source, syndposts, deletes=()):
+    """Insert multiple new relationships at once.
+
+    Each one is handled like :meth:`insert`, :meth:`insert_original_blank`, or
+    :meth:`insert_syndication_blank`, depending on which of its properties are
+    set, but existing relationships are looked up in batched queries, and
+    changes are written with one :func:`ndb.put_multi` and one
+    :func:`ndb.delete_multi`.
+
+    Args:
+      source: :class:`Source` subclass
+      syndposts: sequence of unsaved :class:`SyndicatedPost`\ s
+      deletes: sequence of :class:`ndb.Key`\ s of relationships to delete
+        first, e.g. ones that disappeared from the site
+
+    Returns:
+      list of :class:`SyndicatedPost`, the newly created or preexisting entity
+      for each element of syndposts. Blanks that weren't stored because we
+      already have a relationship for them are returned as is, unsaved.
+    """
+    syndications = sorted({s.syndication for s in syndposts if s.syndication})
+    originals = sorted({s.original for s in syndposts if s.original})
+    max = MAX_ALLOWABLE_QUERIES
+    futures = [
+      cls.query(prop.IN(values[i:i + max]), ancestor=source.key).fetch_async()
+      for prop, values in ((cls.syndication, syndications),
+                           (cls.original, originals))
+      for i in range(0, len(values), max)
+    ]
+
+    to_delete = list(deletes)
+    deleted = set(to_delete)
+    existing = {}
+    for r in itertools.chain.from_iterable(f.get_result() for f in futures):
+      if r.key not in deleted:
+        existing[r.key] = r
+
+    pairs = {}
+    blanks = {}
+    for r in existing.values():
+      pairs.setdefault((r.syndication, r.original), r)
+      if not r.syndication or not r.original:
+        blanks.setdefault((r.syndication, r.original), []).append(r.key)
+    seen_syndications = {s for s, _ in pairs if s}
+    seen_originals = {o for _, o in pairs if o}
+
+    to_put = []
+    # non-blank relationships first, so that they suppress blanks in this batch
+    for r in sorted(syndposts, key=lambda r: not (r.syndication and r.original)):
+      pair = (r.syndication, r.original)
+      if pair in pairs:
+        continue
+      elif r.syndication and r.original:
+        # delete blanks
+        to_delete.extend(blanks.pop((r.syndication, None), []))
+        to_delete.extend(blanks.pop((None, r.original), []))
+      elif r.original in seen_originals or r.syndication in seen_syndications:
+        # blank, and we already have a relationship for it
+        continue
+
+      pairs[pair] = r
+      if r.syndication:
+        seen_syndications.add(r.syndication)
+      if r.original:
+        seen_originals.add(r.original)
+      to_put.append(r)
+
+    if to_delete:
+      ndb.delete_multi(to_delete)
+    if to_put:
+      ndb.put_multi(to_put)
+
+    return [pairs.get((r.syndication, r.original), r) for r in syndposts]
+
 
 class Domain(StringIdModel):
   """A domain owned by a user.
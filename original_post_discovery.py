@@ -22,15 +22,22 @@ lookups in the following primary cases:
     - 1 to 2 HTTP requests to get and parse the h-feed plus 1 additional
       request for *each* post permalink that has not been seen before.
     - 1 DB query for the initial check plus 1 additional DB query for
-      *each* post permalink.
+      every :const:`models.MAX_ALLOWABLE_QUERIES` post permalinks, all run
+      concurrently.
+    - 1 DB transaction to store the new relationships and delete the ones
+      that disappeared.
 """
-import collections
+import concurrent.futures
+import functools
+import hashlib
 import itertools
 import logging
 import mf2util
+import threading
+import urllib.parse
 
+from cachetools import TTLCache
 from granary import as1
-from granary import microformats2
 from oauth_dropins.webutil.appengine_info import DEBUG
 import models
 from models import SyndicatedPost
@@ -43,16 +50,27 @@ MAX_PERMALINK_FETCHES_BETA = 50
 MAX_FEED_ENTRIES = 100
 MAX_ORIGINAL_CANDIDATES = 10
 MAX_MENTION_CANDIDATES = 10
-# this was 30 in google.appengine.ext.ndb. haven't found it in google.cloud.ndb
-# yet, or whether it's even there at all, but we only rarely hit it anyway, so
-# let's just keep it as is for now.
-MAX_ALLOWABLE_QUERIES = 30
+# number of permalink pages to fetch in parallel in _process_author
+PERMALINK_FETCH_THREADS = 10
+# number of original and mention URLs to resolve in parallel in discover
+RESOLVE_THREADS = 8
 
 MF2_HTML_MIME_TYPE= 'text/mf2+html'
 
+# h-entry properties that we use from feed items
+FEED_ITEM_PROPERTIES = ('url', 'syndication', 'updated', 'published')
+
+# trimmed feed items and rel-feeds of author pages and h-feeds, so we only
+# refetch and reparse them when they change. maps string URL to (ETag,
+# Last-Modified, final URL, SHA-1 of HTML, list of feed item dicts, list of
+# feed URLs) tuple. only keeps FEED_ITEM_PROPERTIES in feed items to save
+# memory, since the background service runs on small instances.
+feed_cache_lock = threading.RLock()
+feed_cache = TTLCache(100, 60 * 60 * 6)  # 6h expiration
+
 
 def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
-             already_fetched_hfeeds=None):
+             already_fetched_hfeeds=None, webmention_targets=None):
   """Augments the standard original_post_discovery algorithm with a
   reverse lookup that supports posts without a backlink or citation.
 
@@ -70,6 +88,8 @@ def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
       well as their final destination URLs
     already_fetched_hfeeds: set, URLs that we have already fetched and run
       posse-post-discovery on, so we can avoid running it multiple times
+    webmention_targets: dict, cache of :func:`util.get_webmention_target`
+      results keyed by URL, so we can avoid resolving URLs multiple times
 
   Returns:
     (set(string original post URLs), set(string mention URLs)) tuple
@@ -83,6 +103,9 @@ def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
   if already_fetched_hfeeds is None:
     already_fetched_hfeeds = set()
 
+  if webmention_targets is None:
+    webmention_targets = {}
+
   originals, mentions = as1.original_post_discovery(
     activity, domains=source.domains,
     include_redirect_sources=include_redirect_sources,
@@ -103,7 +126,8 @@ def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
   # original posts are only from the author themselves
   obj_author = obj.get('author', {})
   activity_author = activity.get('actor', {})
-  source_id = source.user_tag_id()
+  user_tag_id = source.user_tag_id()
+  source_id = user_tag_id
   source_username = source.key.id()
   author_id = obj_author.get('id') or activity_author.get('id') or ''
   author_username = obj_author.get('username') or activity_author.get('username') or ''
@@ -122,10 +146,11 @@ def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
   # look for original URL of attachments (e.g. quote tweets)
   for att in obj.get('attachments', []):
     if (att.get('objectType') in ('note', 'article')
-        and att.get('author', {}).get('id') == source.user_tag_id()):
+        and att.get('author', {}).get('id') == user_tag_id):
       logger.debug(f"running original post discovery on attachment: {att.get('id')}")
       att_origs, _ = discover(
-        source, att, include_redirect_sources=include_redirect_sources)
+        source, att, include_redirect_sources=include_redirect_sources,
+        webmention_targets=webmention_targets)
       logger.debug(f'original post discovery found originals for attachment, {att_origs}')
       mentions.update(att_origs)
 
@@ -136,10 +161,22 @@ def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
     logging.info(f'{len(mentions)} mentions, pruning down to {MAX_MENTION_CANDIDATES}')
     mentions = sorted(mentions)[:MAX_MENTION_CANDIDATES]
 
+  # resolving usually means following redirects, which is network bound, so
+  # fill the cache for all of these URLs in parallel first
+  # (originals and mentions may be lists here if they were pruned above)
+  uncached = [url for url in set(originals) | set(mentions)
+              if url not in webmention_targets]
+  if len(uncached) > 1:
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=RESOLVE_THREADS) as executor:
+      for url, target in zip(uncached, executor.map(
+          util.get_webmention_target, uncached)):
+        webmention_targets[url] = target
+
   def resolve(urls):
     resolved = set()
     for url in urls:
-      final, domain, send = util.get_webmention_target(url)
+      final, domain, send = _get_webmention_target(url, webmention_targets)
       if send and domain != source.gr_source.DOMAIN:
         resolved.add(final)
         if include_redirect_sources:
@@ -166,7 +203,8 @@ def discover(source, activity, fetch_hfeed=True, include_redirect_sources=True,
     syndication_url = source.canonicalize_url(syndication_url)
     if syndication_url:
       syndicated = _posse_post_discovery(source, activity, syndication_url,
-                                         fetch_hfeed, already_fetched_hfeeds)
+                                         fetch_hfeed, already_fetched_hfeeds,
+                                         webmention_targets)
       originals.update(syndicated)
     originals = set(util.dedupe_urls(originals))
 
@@ -194,8 +232,13 @@ def refetch(source):
   if not source.updates:
     source.updates = {}
 
+  urls = _get_author_urls(source)
+  if not urls:
+    logger.debug('no author url(s), nothing to refetch')
+    return {}
+
   results = {}
-  for url in _get_author_urls(source):
+  for url in urls:
     results.update(_process_author(source, url, refetch=True))
 
   return results
@@ -224,7 +267,7 @@ def targets_for_response(resp, originals, mentions):
 
 
 def _posse_post_discovery(source, activity, syndication_url, fetch_hfeed,
-                          already_fetched_hfeeds):
+                          already_fetched_hfeeds, webmention_targets=None):
   """Performs the actual meat of the posse-post-discover.
 
   Args:
@@ -237,6 +280,8 @@ def _posse_post_discovery(source, activity, syndication_url, fetch_hfeed,
       relationship
     already_fetched_hfeeds: set, URLs we've already fetched in a
       previous iteration
+    webmention_targets: dict, cache of :func:`util.get_webmention_target`
+      results keyed by URL
 
   Return:
     sequence of string original post urls, possibly empty
@@ -261,12 +306,16 @@ def _posse_post_discovery(source, activity, syndication_url, fetch_hfeed,
     # TODO: Consider using the actor's url, with get_author_urls() as the
     # fallback in the future to support content from non-Bridgy users.
     results = {}
-    for url in _get_author_urls(source):
-      if url not in already_fetched_hfeeds:
-        results.update(_process_author(source, url))
-        already_fetched_hfeeds.add(url)
-      else:
-        logger.debug(f'skipping {url}, already fetched this round')
+    author_urls = _get_author_urls(source)
+    urls_to_process = [url for url in author_urls
+                       if url not in already_fetched_hfeeds]
+    if len(urls_to_process) < len(author_urls):
+      logger.debug(f'skipping {set(author_urls) - set(urls_to_process)}, already fetched this round')
+
+    for url in urls_to_process:
+      results.update(_process_author(
+        source, url, webmention_targets=webmention_targets))
+      already_fetched_hfeeds.add(url)
 
     relationships = results.get(syndication_url, [])
 
@@ -283,7 +332,8 @@ def _posse_post_discovery(source, activity, syndication_url, fetch_hfeed,
   return originals
 
 
-def _process_author(source, author_url, refetch=False, store_blanks=True):
+def _process_author(source, author_url, refetch=False, store_blanks=True,
+                    webmention_targets=None):
   """Fetch the author's domain URL, and look for syndicated posts.
 
   Args:
@@ -292,19 +342,21 @@ def _process_author(source, author_url, refetch=False, store_blanks=True):
     refetch: boolean, whether to refetch and process entries we've seen before
     store_blanks: boolean, whether we should store blank
       :class:`models.SyndicatedPost`\ s when we don't find a relationship
+    webmention_targets: dict, cache of :func:`util.get_webmention_target`
+      results keyed by URL
 
   Return:
     a dict of syndicated_url to a list of new :class:`models.SyndicatedPost`\ s
   """
   # for now use whether the url is a valid webmention target
   # as a proxy for whether it's worth searching it.
-  author_url, _, ok = util.get_webmention_target(author_url)
+  author_url, _, ok = _get_webmention_target(author_url, webmention_targets)
   if not ok:
     return {}
 
   logger.debug(f'fetching author url {author_url}')
   try:
-    author_mf2 = util.fetch_mf2(author_url)
+    author_items, candidates = _fetch_feed(author_url)
   except AssertionError:
     raise  # for unit tests
   except BaseException:
@@ -313,16 +365,14 @@ def _process_author(source, author_url, refetch=False, store_blanks=True):
     logger.info(f'Could not fetch author url {author_url}', exc_info=True)
     return {}
 
-  feeditems = _find_feed_items(author_mf2)
+  # copy so that we can sort it without modifying the cached items
+  feeditems = list(author_items)
 
   # try rel=feeds and rel=alternates
   feed_urls = set()
-  candidates = (author_mf2['rels'].get('feed', []) +
-                [a.get('url') for a in author_mf2.get('alternates', [])
-                 if a.get('type') == MF2_HTML_MIME_TYPE])
   for feed_url in candidates:
     # check that it's html, not too big, etc
-    feed_url, _, feed_ok = util.get_webmention_target(feed_url)
+    feed_url, _, feed_ok = _get_webmention_target(feed_url, webmention_targets)
     if feed_url == author_url:
       logger.debug('author url is the feed url, ignoring')
     elif not feed_ok:
@@ -330,17 +380,20 @@ def _process_author(source, author_url, refetch=False, store_blanks=True):
     else:
       feed_urls.add(feed_url)
 
+  known_domains = set(source.domains)
+  if source.updates is not None:
+    known_domains.update(source.updates.get('domains', []))
+
   for feed_url in feed_urls:
     try:
       logger.debug(f"fetching author's rel-feed {feed_url}")
-      feed_mf2 = util.fetch_mf2(feed_url)
-      feeditems = _merge_hfeeds(feeditems, _find_feed_items(feed_mf2))
+      feed_items, _ = _fetch_feed(feed_url)
+      feeditems = _merge_hfeeds(feeditems, feed_items)
       domain = util.domain_from_link(feed_url)
-      if source.updates is not None and domain not in source.domains:
-        domains = source.updates.setdefault('domains', source.domains)
-        if domain not in domains:
-          logger.info(f'rel-feed found new domain {domain}! adding to source')
-          domains.append(domain)
+      if source.updates is not None and domain not in known_domains:
+        logger.info(f'rel-feed found new domain {domain}! adding to source')
+        known_domains.add(domain)
+        source.updates.setdefault('domains', source.domains).append(domain)
 
     except AssertionError:
       raise  # reraise assertions for unit tests
@@ -349,49 +402,90 @@ def _process_author(source, author_url, refetch=False, store_blanks=True):
 
   # sort by dt-updated/dt-published
   def updated_or_published(item):
-    props = microformats2.first_props(item.get('properties'))
-    return props.get('updated') or props.get('published') or ''
+    # only look up the two properties we need instead of all of first_props()
+    props = item.get('properties') or {}
+    return (util.get_first(props, 'updated') or
+            util.get_first(props, 'published') or '')
 
   feeditems.sort(key=updated_or_published, reverse=True)
 
-  permalink_to_entry = collections.OrderedDict()
+  max = (MAX_PERMALINK_FETCHES_BETA if source.is_beta_user()
+         else MAX_PERMALINK_FETCHES)
+  permalink_to_entry = {}
   for child in feeditems:
+    if len(permalink_to_entry) >= max:
+      logger.info(f'Hit cap of {max} permalinks. Stopping.')
+      break
+
     if 'h-entry' in child['type']:
       permalinks = child['properties'].get('url', [])
       if not permalinks:
         logger.debug('ignoring h-entry with no u-url!')
       for permalink in permalinks:
-        if isinstance(permalink, str):
-          permalink_to_entry[permalink] = child
-        else:
+        if not isinstance(permalink, str):
           logger.warning(f'unexpected non-string "url" property: {permalink}')
-
-    max = (MAX_PERMALINK_FETCHES_BETA if source.is_beta_user()
-           else MAX_PERMALINK_FETCHES)
-    if len(permalink_to_entry) >= max:
-      logger.info(f'Hit cap of {max} permalinks. Stopping.')
-      break
+        elif permalink not in permalink_to_entry:
+          # keep the first (ie newest) h-entry for each permalink
+          permalink_to_entry[permalink] = child
+          if len(permalink_to_entry) >= max:
+            break
 
   # query all preexisting permalinks at once, instead of once per link
   permalinks_list = list(permalink_to_entry.keys())
-  # fetch the maximum allowed entries (currently 30) at a time
-  preexisting_list = itertools.chain.from_iterable(
+  # fetch the maximum allowed entries (currently 30) at a time. start all of
+  # the queries first so that they run concurrently.
+  size = models.MAX_ALLOWABLE_QUERIES
+  futures = [
     SyndicatedPost.query(
-      SyndicatedPost.original.IN(permalinks_list[i:i + MAX_ALLOWABLE_QUERIES]),
-      ancestor=source.key)
-    for i in range(0, len(permalinks_list), MAX_ALLOWABLE_QUERIES))
+      SyndicatedPost.original.IN(permalinks_list[i:i + size]),
+      ancestor=source.key).fetch_async()
+    for i in range(0, len(permalinks_list), size)
+  ]
   preexisting = {}
-  for r in preexisting_list:
+  for r in itertools.chain.from_iterable(f.get_result() for f in futures):
     preexisting.setdefault(r.original, []).append(r)
 
+  # fetch permalinks in parallel, since that's network bound. the rest of
+  # process_entry stays on this thread, since the datastore isn't thread safe
+  # and ndb contexts are thread local. that includes canonicalizing syndication
+  # urls, since source.canonicalize_url may load source.gr_source, which loads
+  # the auth entity.
+  #
+  # feeds often link to the same syndication urls over and over, so cache
+  # canonicalized urls for just this call.
+  canonicalize_url = functools.lru_cache(maxsize=256)(source.canonicalize_url)
   results = {}
-  for permalink, entry in permalink_to_entry.items():
-    logger.debug(f'processing permalink: {permalink}')
-    new_results = process_entry(
-      source, permalink, entry, refetch, preexisting.get(permalink, []),
-      store_blanks=store_blanks)
-    for key, value in new_results.items():
-      results.setdefault(key, []).extend(value)
+  new_syndposts = []
+  deletes = []
+  try:
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=PERMALINK_FETCH_THREADS) as executor:
+      fetches = {}
+      for permalink, entry in permalink_to_entry.items():
+        if refetch or not preexisting.get(permalink):
+          usynd = entry.get('properties', {}).get('syndication', [])
+          fetch_page = _should_fetch_page(
+            source, entry, _canonicalize_urls(canonicalize_url, usynd))
+          fetches[permalink] = executor.submit(
+            _fetch_entry, permalink, fetch_page,
+            webmention_targets=webmention_targets)
+
+      for permalink, entry in permalink_to_entry.items():
+        logger.debug(f'processing permalink: {permalink}')
+        fetch = fetches.get(permalink)
+        new_results = process_entry(
+          source, permalink, entry, refetch, preexisting.get(permalink, []),
+          store_blanks=store_blanks, fetched=fetch.result() if fetch else None,
+          new_syndposts=new_syndposts, deletes=deletes,
+          canonicalize_url=canonicalize_url)
+        for key, value in new_results.items():
+          results.setdefault(key, []).extend(value)
+
+  finally:
+    # store all changes at once, instead of once per link. do this even if we
+    # hit an exception so we don't lose what we found before it.
+    if new_syndposts or deletes:
+      _store_syndposts(source, new_syndposts, deletes, results)
 
   if source.updates is not None and results:
     # keep track of the last time we've seen rel=syndication urls for
@@ -414,14 +508,94 @@ def _merge_hfeeds(feed1, feed2):
   Returns:
     a list of dicts
   """
-  seen = set()
-  for item in feed1:
-    for url in item.get('properties', {}).get('url', []):
-      if isinstance(url, str):
-        seen.add(url)
+  seen = {url for item in feed1
+          for url in item.get('properties', {}).get('url', ())
+          if isinstance(url, str)}
+
+  merged = list(feed1)
+  for item in feed2:
+    urls = item.get('properties', {}).get('url', ())
+    # stops at the first url we've already seen
+    if not any(isinstance(url, str) and url in seen for url in urls):
+      merged.append(item)
+
+  return merged
+
 
-  return feed1 + [item for item in feed2 if all(
-    (url not in seen) for url in item.get('properties', {}).get('url', []) if isinstance(url, str))]
+def _fetch_feed(url, gateway=False):
+  """Fetch an author page or h-feed and return its feed items and rel-feeds.
+
+  Fetches and parses like :func:`util.fetch_mf2`, including only parsing the
+  element with the final URL's fragment id, if any, after redirects. Also sends a conditional GET with
+  the cached ETag and Last-Modified, if any, and reuses the cached results if
+  the server says the page hasn't changed or its HTML is the same as last time.
+
+  Args:
+    url: string
+    gateway: boolean, passed through to :func:`util.requests_get`
+
+  Returns:
+    (list of feed item dicts, list of string rel-feed and mf2 HTML alternate
+    URLs) tuple. Feed items only include :const:`FEED_ITEM_PROPERTIES`. Both
+    lists are shared with the cache, so don't modify them!
+  """
+  with feed_cache_lock:
+    cached = feed_cache.get(url)
+
+  headers = {}
+  if cached:
+    etag, last_modified, _, _, _, _ = cached
+    if etag:
+      headers['If-None-Match'] = etag
+    if last_modified:
+      headers['If-Modified-Since'] = last_modified
+
+  resp = util.requests_get(url, gateway=gateway, headers=headers)
+  if cached and resp.status_code == 304:
+    logger.debug(f'{url} is unchanged, using cached feed')
+    return cached[4:]
+  resp.raise_for_status()
+
+  digest = hashlib.sha1(resp.text.encode('utf-8', 'ignore')).digest()
+  if cached and cached[2:4] == (resp.url, digest):
+    logger.debug(f'{url} is unchanged, using cached feed')
+    items, feed_urls = cached[4:]
+  else:
+    mf2 = util.parse_mf2(resp, id=urllib.parse.urlparse(resp.url).fragment)
+    if not mf2:
+      # e.g. the fragment id isn't in the page. don't cache this, since it may
+      # be temporary.
+      logger.info(f"Couldn't parse {resp.url}, maybe missing fragment element")
+      with feed_cache_lock:
+        feed_cache.pop(url, None)
+      return [], []
+
+    mf2['url'] = resp.url
+    items = [_trim_feed_item(item) for item in _find_feed_items(mf2)]
+    feed_urls = (mf2['rels'].get('feed', []) +
+                 [a.get('url') for a in mf2.get('alternates', [])
+                  if a.get('type') == MF2_HTML_MIME_TYPE])
+
+  with feed_cache_lock:
+    feed_cache[url] = (resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                       resp.url, digest, items, feed_urls)
+  return items, feed_urls
+
+
+def _trim_feed_item(item):
+  """Returns a copy of an mf2 feed item with just the parts we use.
+
+  Args:
+    item: dict, mf2 item
+
+  Returns: dict, with just type and :const:`FEED_ITEM_PROPERTIES`
+  """
+  props = item.get('properties', {})
+  return {
+    'type': item.get('type', []),
+    'properties': {name: props[name] for name in FEED_ITEM_PROPERTIES
+                   if name in props},
+  }
 
 
 def _find_feed_items(mf2):
@@ -451,7 +625,8 @@ def _find_feed_items(mf2):
 
 
 def process_entry(source, permalink, feed_entry, refetch, preexisting,
-                  store_blanks=True):
+                  store_blanks=True, fetched=None, new_syndposts=None,
+                  deletes=None, canonicalize_url=None):
   """Fetch and process an h-entry and save a new :class:`models.SyndicatedPost`.
 
   Args:
@@ -464,6 +639,17 @@ def process_entry(source, permalink, feed_entry, refetch, preexisting,
       for this permalink
     store_blanks: boolean, whether we should store blank
       :class:`models.SyndicatedPost`\ s when we don't find a relationship
+    fetched: optional tuple returned by :func:`_fetch_entry` for this
+      permalink, if it's already been fetched. If None, it's fetched here.
+    new_syndposts: optional list. If provided, new unsaved
+      :class:`models.SyndicatedPost`\ s are appended to it instead of stored,
+      and the caller should store them with
+      :meth:`models.SyndicatedPost.insert_multi`.
+    deletes: list, required if new_syndposts is provided. Keys of
+      :class:`models.SyndicatedPost`\ s that disappeared from the site are
+      appended to it instead of deleted.
+    canonicalize_url: optional callable to use instead of
+      :meth:`source.canonicalize_url`, eg a cached wrapper
 
   Returns:
     a dict from syndicated url to a list of new :class:`models.SyndicatedPost`\ s
@@ -480,50 +666,34 @@ def process_entry(source, permalink, feed_entry, refetch, preexisting,
     if synds:
       logger.debug(f'previously found relationship(s) for original {permalink}: {synds}')
 
+  store = new_syndposts is None
+  if store:
+    new_syndposts = []
+    deletes = []
+
+  if canonicalize_url is None:
+    canonicalize_url = source.canonicalize_url
+
   # first try with the h-entry from the h-feed. if we find the syndication url
   # we're looking for, we don't have to fetch the permalink
-  permalink, _, type_ok = util.get_webmention_target(permalink)
   usynd = feed_entry.get('properties', {}).get('syndication', [])
-  usynd_urls = {url for url in usynd if isinstance(url, str)}
-  if usynd_urls:
-    logger.debug(f'u-syndication links on the h-feed h-entry: {usynd_urls}')
-  results = _process_syndication_urls(source, permalink, usynd_urls, preexisting)
-  success = True
-
+  if usynd:
+    logger.debug(f'u-syndication links on the h-feed h-entry: {usynd}')
+  feed_synd_urls = _canonicalize_urls(canonicalize_url, usynd)
+
+  if fetched is None:
+    fetched = _fetch_entry(
+      permalink, _should_fetch_page(source, feed_entry, feed_synd_urls))
+  permalink, page_url_lists, success = fetched
+  page_synd_urls = _canonicalize_urls(canonicalize_url, *page_url_lists)
+
+  results = _process_syndication_urls(source, permalink, feed_synd_urls,
+                                      preexisting, new_syndposts)
   if results:
     source.updates['last_feed_syndication_url'] = util.now_fn()
-  elif not source.last_feed_syndication_url or not feed_entry:
-    # fetch the full permalink page if we think it might have more details
-    mf2 = None
-    try:
-      if type_ok:
-        logger.debug(f'fetching post permalink {permalink}')
-        mf2 = util.fetch_mf2(permalink)
-    except AssertionError:
-      raise  # for unit tests
-    except BaseException:
-      # TODO limit the number of allowed failures
-      logger.info(f'Could not fetch permalink {permalink}', exc_info=True)
-      success = False
-
-    if mf2:
-      syndication_urls = set()
-      relsynd = mf2['rels'].get('syndication', [])
-      if relsynd:
-        logger.debug(f'rel-syndication links: {relsynd}')
-      syndication_urls.update(url for url in relsynd
-                              if isinstance(url, str))
-      # there should only be one h-entry on a permalink page, but
-      # we'll check all of them just in case.
-      for hentry in (item for item in mf2['items']
-                     if 'h-entry' in item['type']):
-        usynd = hentry.get('properties', {}).get('syndication', [])
-        if usynd:
-          logger.debug(f'u-syndication links: {usynd}')
-        syndication_urls.update(url for url in usynd
-                                if isinstance(url, str))
-      results = _process_syndication_urls(
-        source, permalink, syndication_urls, preexisting)
+  elif page_synd_urls:
+    results = _process_syndication_urls(source, permalink, page_synd_urls,
+                                        preexisting, new_syndposts)
 
   # detect and delete SyndicatedPosts that were removed from the site
   if success:
@@ -531,7 +701,7 @@ def process_entry(source, permalink, feed_entry, refetch, preexisting,
     for syndpost in preexisting:
       if syndpost.syndication and syndpost not in result_syndposts:
         logger.info(f'deleting relationship that disappeared: {syndpost}')
-        syndpost.key.delete()
+        deletes.append(syndpost.key)
         preexisting.remove(syndpost)
 
   if not results:
@@ -541,7 +711,11 @@ def process_entry(source, permalink, feed_entry, refetch, preexisting,
       # remember that this post doesn't have syndication links for this
       # particular source
       logger.debug(f'saving empty relationship so that {permalink} will not be searched again')
-      SyndicatedPost.insert_original_blank(source, permalink)
+      new_syndposts.append(SyndicatedPost(parent=source.key, original=permalink,
+                                          syndication=None))
+
+  if store and (new_syndposts or deletes):
+    _store_syndposts(source, new_syndposts, deletes, results)
 
   # only return results that are not in the preexisting list
   new_results = {}
@@ -555,48 +729,188 @@ def process_entry(source, permalink, feed_entry, refetch, preexisting,
   return new_results
 
 
+def _should_fetch_page(source, feed_entry, feed_synd_urls):
+  """Returns whether we should fetch an h-entry's permalink page.
+
+  We don't need to if the h-entry from the h-feed already has a syndication url
+  for the current source, or if the author's h-feed usually has them.
+
+  Args:
+    source: a :class:`models.Source` subclass
+    feed_entry: the h-feed version of the h-entry dict
+    feed_synd_urls: set of string syndication urls from feed_entry, already
+      canonicalized by :func:`_canonicalize_urls`
+
+  Returns: boolean
+  """
+  return not (feed_synd_urls or (source.last_feed_syndication_url and feed_entry))
+
+
+def _fetch_entry(permalink, fetch_page, webmention_targets=None):
+  """Resolve an h-entry's permalink and optionally fetch its syndication urls.
+
+  Only makes HTTP requests, no datastore operations or :class:`models.Source`
+  calls, so this is safe to run in a worker thread. The syndication urls aren't
+  canonicalized, since :meth:`models.Source.canonicalize_url` may load from the
+  datastore.
+
+  Args:
+    permalink: url of the unprocessed post
+    fetch_page: boolean, whether to fetch the full permalink page
+    webmention_targets: dict, cache of :func:`util.get_webmention_target`
+      results keyed by URL
+
+  Returns:
+    (string resolved permalink, list of lists of raw syndication urls from the
+    permalink page, boolean success) tuple. The list is empty if we didn't fetch
+    the permalink page. success is False if fetching it failed.
+  """
+  permalink, _, type_ok = _get_webmention_target(permalink, webmention_targets)
+  if not fetch_page:
+    return permalink, [], True
+
+  # fetch the full permalink page if we think it might have more details
+  mf2 = None
+  try:
+    if type_ok:
+      logger.debug(f'fetching post permalink {permalink}')
+      mf2 = util.fetch_mf2(permalink)
+  except AssertionError:
+    raise  # for unit tests
+  except BaseException:
+    # TODO limit the number of allowed failures
+    logger.info(f'Could not fetch permalink {permalink}', exc_info=True)
+    return permalink, [], False
+
+  if not mf2:
+    return permalink, [], True
+
+  relsynd = mf2['rels'].get('syndication', [])
+  if relsynd:
+    logger.debug(f'rel-syndication links: {relsynd}')
+  url_lists = [relsynd]
+  # there should only be one h-entry on a permalink page, but
+  # we'll check all of them just in case.
+  for hentry in mf2['items']:
+    if 'h-entry' in hentry['type']:
+      usynd = hentry.get('properties', {}).get('syndication', [])
+      if usynd:
+        logger.debug(f'u-syndication links: {usynd}')
+      url_lists.append(usynd)
+
+  return permalink, url_lists, True
+
+
+def _canonicalize_urls(canonicalize_url, *url_lists):
+  """Canonicalize syndication urls and drop the ones not for this source.
+
+  Skips non-string values, eg nested mf2 objects, in the same pass.
+
+  Args:
+    canonicalize_url: callable, usually :meth:`models.Source.canonicalize_url`
+    url_lists: sequences of unfiltered syndication urls
+
+  Returns:
+    set of string urls
+  """
+  seen = set()
+  canonicalized = set()
+  for urls in url_lists:
+    for url in urls:
+      if isinstance(url, str) and url not in seen:
+        seen.add(url)
+        # source-specific logic to standardize the URL
+        url = canonicalize_url(url)
+        if url:
+          canonicalized.add(url)
+  return canonicalized
+
+
 def _process_syndication_urls(source, permalink, syndication_urls,
-                              preexisting):
-  """Process a list of syndication URLs looking for one that matches the
-  current source. If one is found, stores a new :class:`models.SyndicatedPost`
-  in the db.
+                              preexisting, new_syndposts):
+  """Process a list of syndication URLs that match the current source. Creates
+  a new :class:`models.SyndicatedPost` for each one that isn't already in
+  preexisting.
 
   Args:
     source: a :class:`models.Source` subclass
     permalink: a string. the current h-entry permalink
-    syndication_urls: a collection of strings. the unfitered list
-      of syndication urls
+    syndication_urls: a collection of strings. syndication urls for the current
+      source, already canonicalized by :func:`_canonicalize_urls`
     preexisting: a list of previously discovered :class:`models.SyndicatedPost`\ s
+    new_syndposts: list. new unsaved :class:`models.SyndicatedPost`\ s are
+      appended to it so that the caller can store them all at once
 
   Returns:
     dict mapping string syndication url to list of :class:`models.SyndicatedPost`\ s
   """
+  # index preexisting so we can look up each url in it with one dict lookup
+  preexisting_by_url = {}
+  for sp in preexisting:
+    if sp.original == permalink:
+      preexisting_by_url.setdefault(sp.syndication, sp)
+
   results = {}
-  # save the results (or lack thereof) to the db, and put them in a
+  # collect the results to save to the db, and put them in a
   # map for immediate use
   for url in syndication_urls:
-    # source-specific logic to standardize the URL
-    url = source.canonicalize_url(url)
-    if not url:
-      continue
-
     # TODO: save future lookups by saving results for other sources too (note:
     # query the appropriate source subclass by author.domains, rather than
     # author.domain_urls)
     #
     # we may have already seen this relationship, save a DB lookup by
     # finding it in the preexisting list
-    relationship = next((sp for sp in preexisting
-                         if sp.syndication == url
-                         and sp.original == permalink), None)
+    relationship = preexisting_by_url.get(url)
     if not relationship:
       logger.debug(f'saving discovered relationship {url} -> {permalink}')
-      relationship = SyndicatedPost.insert(source, syndication=url, original=permalink)
+      relationship = SyndicatedPost(parent=source.key, syndication=url,
+                                    original=permalink)
+      new_syndposts.append(relationship)
     results.setdefault(url, []).append(relationship)
 
   return results
 
 
+def _store_syndposts(source, new_syndposts, deletes, results):
+  """Stores and deletes relationships with :meth:`SyndicatedPost.insert_multi`.
+
+  Also replaces the unsaved :class:`models.SyndicatedPost`\ s in results with
+  the stored ones, which may be preexisting entities for duplicates.
+
+  Args:
+    source: a :class:`models.Source` subclass
+    new_syndposts: list of unsaved :class:`models.SyndicatedPost`\ s
+    deletes: list of :class:`ndb.Key`\ s of relationships to delete
+    results: dict mapping string syndication url to list of
+      :class:`models.SyndicatedPost`\ s, modified in place
+  """
+  stored = SyndicatedPost.insert_multi(source, new_syndposts, deletes=deletes)
+  # ndb entities aren't hashable, so map by identity
+  stored_by_id = {id(new): s for new, s in zip(new_syndposts, stored)}
+  for syndposts in results.values():
+    syndposts[:] = [stored_by_id.get(id(s), s) for s in syndposts]
+
+
+def _get_webmention_target(url, cache=None):
+  """Wraps :func:`util.get_webmention_target` with an optional cache.
+
+  Args:
+    url: string
+    cache: dict mapping string URL to :func:`util.get_webmention_target` result,
+      or None to not cache
+
+  Returns:
+    (string url, string pretty domain, boolean) tuple
+  """
+  if cache is None:
+    return util.get_webmention_target(url)
+
+  target = cache.get(url)
+  if target is None:
+    target = cache[url] = util.get_webmention_target(url)
+  return target
+
+
 def _get_author_urls(source):
   max = models.MAX_AUTHOR_URLS
   urls = source.get_author_urls()
@@ -905,3 +905,53 @@ class SyndicatedPostTest(testutil.AppTest):
     ).fetch()
 
     self.assertEqual(1, len(rs))
+
+  def test_insert_multi(self):
+    """insert_multi should follow the same rules as the insert* methods."""
+    SyndicatedPost.insert_multi(self.source, [
+      # duplicate
+      SyndicatedPost(parent=self.source.key, original='http://original/post/url',
+                     syndication='http://silo/post/url'),
+      # replaces blanks
+      SyndicatedPost(parent=self.source.key,
+                     original='http://original/no-syndication',
+                     syndication='http://silo/no-original'),
+      # new
+      SyndicatedPost(parent=self.source.key, original='http://original/new',
+                     syndication='http://silo/new'),
+      # blanks that already have relationships
+      SyndicatedPost(parent=self.source.key, original='http://original/new',
+                     syndication=None),
+      SyndicatedPost(parent=self.source.key, original=None,
+                     syndication='http://silo/post/url'),
+      # new blank
+      SyndicatedPost(parent=self.source.key, original='http://original/blank',
+                     syndication=None),
+    ])
+
+    self.assertCountEqual([
+      ('http://original/post/url', 'http://silo/post/url'),
+      ('http://original/post/url', 'http://silo/another/url'),
+      ('http://original/another/post', 'http://silo/post/url'),
+      ('http://original/no-syndication', 'http://silo/no-original'),
+      ('http://original/new', 'http://silo/new'),
+      ('http://original/blank', None),
+    ], [(r.original, r.syndication)
+        for r in SyndicatedPost.query(ancestor=self.source.key)])
+
+  def test_insert_multi_returns_stored(self):
+    """insert_multi should return the stored entity for each relationship."""
+    new = SyndicatedPost(parent=self.source.key, original='http://original/new',
+                         syndication='http://silo/new')
+    stored = SyndicatedPost.insert_multi(self.source, [
+      SyndicatedPost(parent=self.source.key, original='http://original/post/url',
+                     syndication='http://silo/post/url'),
+      new,
+      # duplicate within the batch
+      SyndicatedPost(parent=self.source.key, original='http://original/new',
+                     syndication='http://silo/new'),
+    ], deletes=[self.relationships[1].key])
+
+    self.assertEqual([self.relationships[0].key, new.key, new.key],
+                     [r.key for r in stored])
+    self.assertIsNone(self.relationships[1].key.get())
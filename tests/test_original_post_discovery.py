@@ -3,8 +3,11 @@
 """
 from datetime import datetime, timezone
 from string import hexdigits
+import threading
 
+from oauth_dropins.webutil.testutil import requests_response
 from oauth_dropins.webutil.util import json_dumps, json_loads
+import requests
 from requests.exceptions import HTTPError
 
 from github import GitHub
@@ -1035,6 +1038,115 @@ class OriginalPostDiscoveryTest(testutil.AppTest):
       ('http://author/permalink2', 'https://fa.ke/post/url2'),
       ('http://author/permalink3', None))
 
+  def test_refetch_fetches_permalinks_in_parallel(self):
+    """Permalink pages should be fetched concurrently, in multiple threads."""
+    self.mox.stubs.Set(original_post_discovery, 'PERMALINK_FETCH_THREADS', 3)
+
+    pages = {'http://author/': """
+    <html class="h-feed">
+      <div class="h-entry"><a class="u-url" href="http://author/post1"></a></div>
+      <div class="h-entry"><a class="u-url" href="http://author/post2"></a></div>
+      <div class="h-entry"><a class="u-url" href="http://author/post3"></a></div>
+    </html>"""}
+    for i in range(1, 4):
+      pages[f'http://author/post{i}'] = f"""
+      <html class="h-entry">
+        <a class="u-url" href="http://author/post{i}"></a>
+        <a class="u-syndication" href="https://fa.ke/post/{i}"></a>
+      </html>"""
+
+    # mocked requests calls are expected in order, so use a plain stub. each
+    # permalink fetch waits until all three are in flight, which times out and
+    # fails if they're fetched one at a time.
+    barrier = threading.Barrier(3, timeout=10)
+    def get(url, **kwargs):
+      if url != 'http://author/':
+        barrier.wait()
+      return requests_response(pages[url], url=url, content_type='text/html')
+    self.mox.stubs.Set(requests, 'get', get)
+
+    self.assertCountEqual(['https://fa.ke/post/1', 'https://fa.ke/post/2',
+                           'https://fa.ke/post/3'], refetch(self.source).keys())
+    self.assert_syndicated_posts(
+      ('http://author/post1', 'https://fa.ke/post/1'),
+      ('http://author/post2', 'https://fa.ke/post/2'),
+      ('http://author/post3', 'https://fa.ke/post/3'))
+
+  def test_refetch_author_page_not_modified(self):
+    """If the author page returns 304, we should reuse its cached mf2."""
+    self.expect_requests_get('http://author/', """
+    <html class="h-feed">
+      <div class="h-entry">
+        <a class="u-url" href="http://author/permalink"></a>
+        <a class="u-syndication" href="https://fa.ke/post/url"></a>
+      </div>
+    </html>""", response_headers={'ETag': '"abc"'})
+    self.expect_requests_get('http://author/', status_code=304,
+                             headers={'If-None-Match': '"abc"'})
+    self.mox.ReplayAll()
+
+    self.assertEqual(['https://fa.ke/post/url'], list(refetch(self.source)))
+    self.assertEqual({}, refetch(self.source))
+    self.assert_syndicated_posts(
+      ('http://author/permalink', 'https://fa.ke/post/url'))
+
+  def test_refetch_author_page_unchanged(self):
+    """If the author page's HTML hasn't changed, we shouldn't reparse it."""
+    html = """
+    <html class="h-feed">
+      <div class="h-entry">
+        <a class="u-url" href="http://author/permalink"></a>
+        <a class="u-syndication" href="https://fa.ke/post/url"></a>
+      </div>
+    </html>"""
+    self.expect_requests_get('http://author/', html)
+    self.expect_requests_get('http://author/', html)
+    self.mox.ReplayAll()
+
+    parse_mf2 = util.parse_mf2
+    parsed = []
+    def count_parse_mf2(*args, **kwargs):
+      parsed.append(args)
+      return parse_mf2(*args, **kwargs)
+    self.mox.stubs.Set(util, 'parse_mf2', count_parse_mf2)
+
+    self.assertEqual(['https://fa.ke/post/url'], list(refetch(self.source)))
+    self.assertEqual({}, refetch(self.source))
+    self.assertEqual(1, len(parsed))
+    self.assert_syndicated_posts(
+      ('http://author/permalink', 'https://fa.ke/post/url'))
+
+  def test_refetch_stores_relationships_before_exception(self):
+    """If one permalink fails, we should still store the ones before it."""
+    self.expect_requests_get('http://author/', """
+    <html class="h-feed">
+      <div class="h-entry">
+        <a class="u-url" href="http://author/permalink"></a>
+        <a class="u-syndication" href="https://fa.ke/post/url"></a>
+      </div>
+      <div class="h-entry">
+        <a class="u-url" href="http://author/permalink2"></a>
+      </div>
+    </html>""")
+    self.expect_requests_get('http://author/permalink2', """
+    <html class="h-entry">
+      <a class="u-url" href="http://author/permalink2"></a>
+      <a class="u-syndication" href="https://fa.ke/post/fail"></a>
+    </html>""")
+    self.mox.ReplayAll()
+
+    canonicalize_url = self.source.canonicalize_url
+    def canonicalize_or_fail(url, **kwargs):
+      if url.endswith('/fail'):
+        raise RuntimeError('foo')
+      return canonicalize_url(url, **kwargs)
+    self.mox.stubs.Set(self.source, 'canonicalize_url', canonicalize_or_fail)
+
+    with self.assertRaises(RuntimeError):
+      refetch(self.source)
+    self.assert_syndicated_posts(
+      ('http://author/permalink', 'https://fa.ke/post/url'))
+
   def test_refetch_multiple_responses_same_activity(self):
     """Ensure that refetching a post that has several replies does not
     generate duplicate original -> None blank entries in the
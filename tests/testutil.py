@@ -21,7 +21,7 @@ from oauth_dropins.webutil.util import json_dumps, json_loads
 import requests
 from requests import post as orig_requests_post
 
-import flask_app, flask_background, util
+import flask_app, flask_background, original_post_discovery, util
 from models import BlogPost, Publish, PublishedPage, Response, Source
 
 logger = logging.getLogger(__name__)
@@ -306,6 +306,10 @@ class TestCase(testutil.TestCase):
     util.BLOCKLIST.add('fa.ke')
 
     util.webmention_endpoint_cache.clear()
+    original_post_discovery.feed_cache.clear()
+    # mocked requests calls are expected in order, and mox isn't thread safe
+    self.mox.stubs.Set(original_post_discovery, 'PERMALINK_FETCH_THREADS', 1)
+    self.mox.stubs.Set(original_post_discovery, 'RESOLVE_THREADS', 1)
     self.stubbed_create_task = False
     tasks_client.create_task = lambda *args, **kwargs: Task(name='foo')
 